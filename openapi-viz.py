@@ -2,26 +2,195 @@
 # MIT License, 2025, Karl Larsaeus <karl@ninjacontrol.com>
 
 import json
+import os
+from collections import deque
+from urllib.parse import unquote
 import yaml
 import argparse
 from graphviz import Digraph
 
+try:
+    # libyaml-backed loader, considerably faster on large specs
+    from yaml import CSafeLoader as _YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as _YAMLLoader
+
+# Characters that must be escaped inside Graphviz HTML-like labels
+_HTML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+
+def _html_escape(text):
+    """Escape a value for use inside a Graphviz HTML-like label."""
+    return str(text).translate(_HTML_ESCAPES)
+
+
+def _ref_owner(ref):
+    """Return the '#/components/<kind>/<name>' path of the component a $ref points into.
+
+    Refs into a component (e.g. '#/components/schemas/Pet/properties/owner') are cut
+    back to the component itself, and the name is decoded from its URI fragment and
+    JSON pointer escapes. Returns None for refs outside of the spec's components.
+    """
+    if not ref.startswith('#/components/'):
+        return None
+    parts = ref[len('#/components/'):].split('/', 2)
+    if len(parts) < 2:
+        return None
+    kind, name = (unquote(part).replace('~1', '/').replace('~0', '~') for part in parts[:2])
+    return f"#/components/{kind}/{name}"
+
+
+# Fixed parts of the label shown for schema nodes that aren't property tables
+_TYPE_LABEL_HEAD = "<BR/><FONT POINT-SIZE='10'>type: "
+_TYPE_LABEL_TAIL = "</FONT>>"
+
+
+def _type_label(name, type_text):
+    """Build a node label showing an escaped schema name above its escaped type description."""
+    return "".join(("<", name, _TYPE_LABEL_HEAD, type_text, _TYPE_LABEL_TAIL))
+
+
+# Inline objects with at most this many plain properties are drawn inside their parent's table
+_INLINE_MAX_PROPERTIES = 4
+
+
 class OpenAPIGraphGenerator:
-    def __init__(self, spec_path):
+    __slots__ = ('spec_path', 'emit_all', 'cache', 'spec', 'graph', 'processed_refs',
+                 '_ref_name_cache', '_ref_to_id', '_inline_cache', '_refs_by_owner')
+
+    def __init__(self, spec_path=None, emit_all=False, cache=False, spec=None):
+        """Create a generator for an OpenAPI spec, read from a file or given as a dict.
+
+        Args:
+            spec_path: Path to the OpenAPI schema file (YAML or JSON)
+            emit_all: If True, include component schemas that no path references
+            cache: If True, keep the parsed YAML spec in a JSON file next to it
+                and reuse it while the spec file is unchanged
+            spec: An already parsed spec to use instead of loading `spec_path`
+        """
+        if spec is None and spec_path is None:
+            raise ValueError("Either spec_path or spec must be given")
         self.spec_path = spec_path
-        self.spec = self._load_spec()
+        self.emit_all = emit_all
+        self.cache = cache
+        self.spec = spec if spec is not None else self._load_spec()
         self.graph = Digraph('API_Graph', format='png')
         self.graph.attr(rankdir='LR', size='8,5', fontname='Helvetica')
         self.graph.attr('node', shape='box', style='filled', fillcolor='lightblue', fontname='Helvetica')
-        self.processed_refs = set()  # Track processed references to avoid duplicates
+        self.processed_refs = set()  # Ids of nodes already emitted; $ref targets are linked, never expanded
+        self._ref_name_cache = {}  # $ref string -> referenced component name
+        self._ref_to_id = {}  # $ref string -> graph node id of the referenced schema
+        self._inline_cache = {}  # canonical inline schema -> id of the node already emitted for it
+        self._index_refs(self.spec)
 
     def _load_spec(self):
         """Load the OpenAPI specification from a file."""
+        is_yaml = self.spec_path.endswith('.yaml') or self.spec_path.endswith('.yml')
+        if self.cache and is_yaml:
+            return self._load_cached_spec()
+
+        with open(self.spec_path, 'r') as f:
+            if is_yaml:
+                return yaml.load(f, Loader=_YAMLLoader)
+            else:
+                return json.loads(f.read())
+
+    def _load_cached_spec(self):
+        """Load a YAML spec from its JSON cache file, re-parsing and rewriting the cache when stale.
+
+        The cache is keyed on the modification time and size of the spec file. As the
+        cache is JSON, a spec loaded from it has non-string keys (e.g. response codes)
+        as strings and dates as ISO strings; specs that JSON cannot hold at all, such
+        as ones with date keys, are not cached.
+        """
+        cache_path = f"{self.spec_path}.cache.json"
+        st = os.stat(self.spec_path)
+        stamp = [st.st_mtime_ns, st.st_size]
+
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.loads(f.read())
+            if cached['stamp'] == stamp:
+                return cached['spec']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # Missing, unreadable or stale cache
+
         with open(self.spec_path, 'r') as f:
-            if self.spec_path.endswith('.yaml') or self.spec_path.endswith('.yml'):
-                return yaml.safe_load(f)
+            spec = yaml.load(f, Loader=_YAMLLoader)
+
+        try:
+            cache_text = json.dumps({'stamp': stamp, 'spec': spec}, default=str)
+        except (TypeError, ValueError):
+            return spec  # Not representable in JSON; the cache is only an optimization
+
+        # Write to a temporary file first so a failed write never leaves a truncated cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(cache_text)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return spec
+
+    def _index_refs(self, spec):
+        """Resolve every $ref in the spec to its component name and node id up front.
+
+        The refs found are also recorded per owner in `self._refs_by_owner`: each
+        component is keyed by its own ref path (e.g. '#/components/schemas/Pet'),
+        everything else by its top-level section (e.g. 'paths').
+        """
+        self._refs_by_owner = {}
+        if not isinstance(spec, dict):
+            return
+
+        for section, value in spec.items():
+            if section == 'components' and isinstance(value, dict):
+                for kind, entries in value.items():
+                    if not isinstance(entries, dict):
+                        continue
+                    for name, entry in entries.items():
+                        self._refs_by_owner[f"#/components/{kind}/{name}"] = self._collect_refs(entry)
             else:
-                return json.load(f)
+                self._refs_by_owner[section] = self._collect_refs(value)
+
+    def _collect_refs(self, root):
+        """Return the set of $ref strings used anywhere below `root`, indexing each one."""
+        refs = set()
+        pending = deque([root])
+        while pending:
+            node = pending.pop()
+            if isinstance(node, dict):
+                ref = node.get('$ref')
+                if isinstance(ref, str):
+                    refs.add(ref)
+                    if ref not in self._ref_to_id:
+                        name = ref.rsplit('/', 1)[-1]
+                        self._ref_name_cache[ref] = name
+                        self._ref_to_id[ref] = f"schema_{name}"
+                pending.extend(node.values())
+            elif isinstance(node, list):
+                pending.extend(node)
+        return refs
+
+    def _ref_id(self, ref):
+        """Return the graph node id of the schema a $ref points to."""
+        ref_id = self._ref_to_id.get(ref)
+        if ref_id is None:
+            ref_id = f"schema_{self._ref_name(ref)}"
+            self._ref_to_id[ref] = ref_id
+        return ref_id
+
+    def _ref_name(self, ref):
+        """Return the component name a $ref points to, e.g. 'Pet' for '#/components/schemas/Pet'."""
+        name = self._ref_name_cache.get(ref)
+        if name is None:
+            name = ref.rsplit('/', 1)[-1]
+            self._ref_name_cache[ref] = name
+        return name
 
     def generate_graph(self):
         """Generate the GraphViz representation of the API."""
@@ -49,167 +218,298 @@ class OpenAPIGraphGenerator:
         with self.graph.subgraph(name='cluster_schemas') as schemas_graph:
             schemas_graph.attr(label='Schemas', style='filled', fillcolor='lightcyan')
 
+            reachable = None if self.emit_all else self._reachable_schemas()
+
             for schema_name, schema in schemas.items():
+                if reachable is not None and str(schema_name) not in reachable:
+                    continue
                 schema_id = f"schema_{schema_name}"
 
                 # Process the schema type and create the node
                 self._process_type(schema_name, schema, schema_id, schemas_graph)
 
-    def _properties_as_html_table(self, schema_name, properties, parent_id, graph):
-        """Convert properties to an HTML table format with links to referenced types."""
+    def _reachable_schemas(self):
+        """Return the names of component schemas reachable from the spec's paths.
+
+        Returns None when the spec defines no paths, in which case every schema
+        is considered reachable.
+        """
+        if not self.spec.get('paths'):
+            return None
+
+        # Start from the components referenced outside of components (paths, webhooks, ...)
+        seen = {_ref_owner(ref) for owner, refs in self._refs_by_owner.items()
+                if not owner.startswith('#/') for ref in refs}
+        seen.discard(None)
+        pending = list(seen)
+        while pending:
+            owner = pending.pop()
+            for child in self._refs_by_owner.get(owner, ()):
+                child_owner = _ref_owner(child)
+                if child_owner is not None and child_owner not in seen:
+                    seen.add(child_owner)
+                    pending.append(child_owner)
+
+        prefix = '#/components/schemas/'
+        return {owner[len(prefix):] for owner in seen if owner.startswith(prefix)}
+
+    def _properties_as_html_table(self, schema_name, properties, parent_id, edges, work):
+        """Convert properties to an HTML table format with links to referenced types.
+
+        Links are appended to `edges` as (source, target, label) tuples. Inline object
+        definitions are queued on the `work` list and processed by `_process_type`
+        once the current node has been emitted.
+        """
         if not properties:
             return "<TABLE><TR><TD>No properties</TD></TR></TABLE>"
 
-        table = "<TABLE BORDER='0' CELLBORDER='1' CELLSPACING='0'>"
-        table += f"<TR><TD COLSPAN='2'><B>{schema_name}</B></TD></TR>"
-        table += "<TR><TD><B>Property</B></TD><TD><B>Type</B></TD></TR>"
+        rows = [
+            "<TABLE BORDER='0' CELLBORDER='1' CELLSPACING='0'>",
+            f"<TR><TD COLSPAN='2'><B>{_html_escape(schema_name)}</B></TD></TR>",
+            "<TR><TD><B>Property</B></TD><TD><B>Type</B></TD></TR>",
+        ]
+
+        # Local aliases for the per-property loop below
+        add_row = rows.append
+        add_edge = edges.append
+        ref_id_of = self._ref_id
+        queue_inline = self._queue_inline
+        link_anyof = self._link_anyof
+        label_of = self._get_property_type_label
 
         for prop_name, prop_details in properties.items():
-            prop_type = self._get_property_type_label(prop_details)
+            ref = prop_details.get('$ref')
+            any_of = prop_details.get('anyOf')
+            ptype = prop_details.get('type')
+            items = prop_details.get('items')
+            props = prop_details.get('properties')
+
+            prop_cell = _html_escape(prop_name)
+
+            # Small inline objects are expanded in place instead of becoming nodes of their own
+            if ptype == 'object' and props is not None:
+                nested_table = self._inline_props_html("object", props)
+            elif ptype == 'array' and items is not None and items.get('type') == 'object' and 'properties' in items:
+                nested_table = self._inline_props_html("array of object", items['properties'])
+            else:
+                nested_table = None
+            if nested_table is not None:
+                add_row(f"<TR><TD>{prop_cell}</TD><TD>{nested_table}</TD></TR>")
+                continue
+
             port_name = f"port_{prop_name}"
+            port = f"{parent_id}:{port_name}"
+
+            # Link referenced and inline types, deriving the type label along the way
+            if ref is not None:
+                add_edge((port, ref_id_of(ref), prop_name))
+                prop_type = f"reference to {self._ref_name(ref)}"
+            elif any_of is not None:
+                types = link_anyof(any_of, port, f"{prop_name} (anyOf[", "])",
+                                   f"{prop_name} anyOf", f"{parent_id}_{prop_name}_anyOf", edges, work)
+                prop_type = f"anyOf: {', '.join(types)}"
+            elif ptype == 'array' and items is not None:
+                items_ref = items.get('$ref')
+                items_any_of = items.get('anyOf')
+                if items_ref is not None:
+                    add_edge((port, ref_id_of(items_ref), f"{prop_name} (array)"))
+                    prop_type = f"array of {self._ref_name(items_ref)}"
+                elif items_any_of is not None:
+                    types = link_anyof(items_any_of, port, f"{prop_name} (array anyOf[", "])",
+                                       f"{prop_name} array anyOf", f"{parent_id}_{prop_name}_array_anyOf", edges, work)
+                    prop_type = f"array of anyOf: {', '.join(types)}"
+                else:
+                    if items.get('type') == 'object' and 'properties' in items:
+                        # Handle inline object definitions in array items
+                        nested_id = queue_inline(f"{prop_name} items",
+                                                 {'type': 'object', 'properties': items['properties']},
+                                                 f"{parent_id}_{prop_name}_items", work)
+                        add_edge((port, nested_id, f"{prop_name} (array)"))
+                    prop_type = label_of(prop_details)
+            elif ptype == 'object' and props is not None:
+                # Handle inline object definitions
+                nested_id = queue_inline(f"{prop_name}",
+                                         {'type': 'object', 'properties': props},
+                                         f"{parent_id}_{prop_name}", work)
+                add_edge((port, nested_id, prop_name))
+                prop_type = label_of(prop_details)
+            else:
+                prop_type = label_of(prop_details)
+            prop_type = _html_escape(prop_type)
 
             # Add PORT attribute to the type cell for properties that reference other types
-            if '$ref' in prop_details or 'anyOf' in prop_details or (prop_details.get('type') == 'array' and 'items' in prop_details) or (prop_details.get('type') == 'object' and 'properties' in prop_details):
-                table += f"<TR><TD>{prop_name}</TD><TD PORT=\"{port_name}\">{prop_type}</TD></TR>"
+            if ref is not None or any_of is not None or (ptype == 'array' and items is not None) or (ptype == 'object' and props is not None):
+                add_row(f"<TR><TD>{prop_cell}</TD><TD PORT=\"{_html_escape(port_name)}\">{prop_type}</TD></TR>")
             else:
-                table += f"<TR><TD>{prop_name}</TD><TD>{prop_type}</TD></TR>"
-
-            # Create edges for array and object properties
-            if '$ref' in prop_details:
-                ref_type = prop_details['$ref'].split('/')[-1]
-                ref_id = f"schema_{ref_type}"
-                graph.edge(f"{parent_id}:{port_name}", ref_id, label=prop_name)
-            elif 'anyOf' in prop_details:
-                # Handle anyOf in properties
-                for i, item in enumerate(prop_details['anyOf']):
-                    if '$ref' in item:
-                        ref_type = item['$ref'].split('/')[-1]
-                        ref_id = f"schema_{ref_type}"
-                        graph.edge(f"{parent_id}:{port_name}", ref_id, label=f"{prop_name} (anyOf[{i}])")
-                    elif 'type' in item and item['type'] == 'object' and 'properties' in item:
-                        # Handle inline object definitions in anyOf
-                        nested_id = f"{parent_id}_{prop_name}_anyOf_{i}"
-                        self._process_type(f"{prop_name} anyOf {i}", 
-                                           {'type': 'object', 'properties': item['properties']}, 
-                                           nested_id, graph)
-                        graph.edge(f"{parent_id}:{port_name}", nested_id, label=f"{prop_name} (anyOf[{i}])")
-            elif prop_details.get('type') == 'array' and 'items' in prop_details:
-                if '$ref' in prop_details['items']:
-                    ref_type = prop_details['items']['$ref'].split('/')[-1]
-                    ref_id = f"schema_{ref_type}"
-                    graph.edge(f"{parent_id}:{port_name}", ref_id, label=f"{prop_name} (array)")
-                elif 'anyOf' in prop_details['items']:
-                    # Handle anyOf in array items
-                    for i, item in enumerate(prop_details['items']['anyOf']):
-                        if '$ref' in item:
-                            ref_type = item['$ref'].split('/')[-1]
-                            ref_id = f"schema_{ref_type}"
-                            graph.edge(f"{parent_id}:{port_name}", ref_id, label=f"{prop_name} (array anyOf[{i}])")
-                        elif 'type' in item and item['type'] == 'object' and 'properties' in item:
-                            # Handle inline object definitions in anyOf
-                            nested_id = f"{parent_id}_{prop_name}_array_anyOf_{i}"
-                            self._process_type(f"{prop_name} array anyOf {i}", 
-                                               {'type': 'object', 'properties': item['properties']}, 
-                                               nested_id, graph)
-                            graph.edge(f"{parent_id}:{port_name}", nested_id, label=f"{prop_name} (array anyOf[{i}])")
-                elif 'type' in prop_details['items'] and prop_details['items']['type'] == 'object':
-                    # Handle inline object definitions in array items
-                    if 'properties' in prop_details['items']:
-                        nested_id = f"{parent_id}_{prop_name}_items"
-                        nested_props = prop_details['items']['properties']
-                        self._process_type(f"{prop_name} items", 
-                                           {'type': 'object', 'properties': nested_props}, 
-                                           nested_id, graph)
-                        graph.edge(f"{parent_id}:{port_name}", nested_id, label=f"{prop_name} (array)")
-            elif prop_details.get('type') == 'object' and 'properties' in prop_details:
-                # Handle inline object definitions
-                nested_id = f"{parent_id}_{prop_name}"
-                self._process_type(f"{prop_name}", 
-                                   {'type': 'object', 'properties': prop_details['properties']}, 
-                                   nested_id, graph)
-                graph.edge(f"{parent_id}:{port_name}", nested_id, label=prop_name)
+                add_row(f"<TR><TD>{prop_cell}</TD><TD>{prop_type}</TD></TR>")
+
+        rows.append("</TABLE>")
+        return "".join(rows)
 
-        table += "</TABLE>"
-        return table
+    def _inline_props_html(self, type_text, properties):
+        """Render a small inline object as a nested HTML table.
+
+        Returns None if the object has too many properties, or any property that
+        needs an edge of its own, in which case it gets a separate node.
+        """
+        if not properties or len(properties) > _INLINE_MAX_PROPERTIES:
+            return None
+
+        rows = [
+            "<TABLE BORDER='0' CELLBORDER='1' CELLSPACING='0'>",
+            f"<TR><TD COLSPAN='2'>{type_text}</TD></TR>",
+        ]
+        for prop_name, prop_details in properties.items():
+            if not self._is_plain_property(prop_details):
+                return None
+            rows.append(f"<TR><TD>{_html_escape(prop_name)}</TD>"
+                        f"<TD>{_html_escape(self._get_property_type_label(prop_details))}</TD></TR>")
+        rows.append("</TABLE>")
+        return "".join(rows)
+
+    @staticmethod
+    def _is_plain_property(prop_details):
+        """Check whether a property is drawn without any edges to other nodes."""
+        if '$ref' in prop_details or 'anyOf' in prop_details:
+            return False
+        if prop_details.get('type') == 'object' and 'properties' in prop_details:
+            return False
+        items = prop_details.get('items')
+        if items is not None and ('$ref' in items or 'anyOf' in items or 'properties' in items):
+            return False
+        return True
+
+    def _queue_inline(self, schema_name, schema, schema_id, work):
+        """Queue an inline schema on `work` and return the node id that edges should point to.
+
+        Structurally identical inline schemas share the node created for the first occurrence.
+        """
+        try:
+            key = json.dumps(schema, sort_keys=True, default=str)
+        except (RecursionError, TypeError, ValueError):
+            # Too deeply nested to serialize, or has keys that can't be sorted
+            # (YAML turns keys like `on` or `200` into bools and ints); give it a node of its own
+            work.append((schema_name, schema, schema_id))
+            return schema_id
+        existing_id = self._inline_cache.get(key)
+        if existing_id is not None:
+            return existing_id
+        self._inline_cache[key] = schema_id
+        work.append((schema_name, schema, schema_id))
+        return schema_id
 
     def _get_property_type_label(self, prop_details):
         """Get a human-readable label for a property type."""
-        if '$ref' in prop_details:
-            ref_type = prop_details['$ref'].split('/')[-1]
-            return f"reference to {ref_type}"
-        elif 'anyOf' in prop_details:
-            types = []
-            for item in prop_details['anyOf']:
-                if '$ref' in item:
-                    types.append(item['$ref'].split('/')[-1])
-                elif 'type' in item:
-                    types.append(item['type'])
-                else:
-                    types.append("unknown")
-            return f"anyOf: {', '.join(types)}"
-        elif 'type' in prop_details:
-            prop_type = prop_details['type']
-            if prop_type == 'array':
-                if 'items' in prop_details:
-                    if '$ref' in prop_details['items']:
-                        item_type = prop_details['items']['$ref'].split('/')[-1]
-                        return f"array of {item_type}"
-                    elif 'anyOf' in prop_details['items']:
-                        types = []
-                        for item in prop_details['items']['anyOf']:
-                            if '$ref' in item:
-                                types.append(item['$ref'].split('/')[-1])
-                            elif 'type' in item:
-                                types.append(item['type'])
-                            else:
-                                types.append("unknown")
-                        return f"array of anyOf: {', '.join(types)}"
-                    elif 'type' in prop_details['items']:
-                        return f"array of {prop_details['items']['type']}"
-                return "array"
-            return prop_type
-        return "unknown"
+        ref = prop_details.get('$ref')
+        if ref is not None:
+            return f"reference to {self._ref_name(ref)}"
+        any_of = prop_details.get('anyOf')
+        if any_of is not None:
+            return f"anyOf: {', '.join(self._anyof_type_names(any_of))}"
+        prop_type = prop_details.get('type')
+        if prop_type is None:
+            return "unknown"
+        if prop_type == 'array':
+            items = prop_details.get('items')
+            if items is not None:
+                items_ref = items.get('$ref')
+                if items_ref is not None:
+                    return f"array of {self._ref_name(items_ref)}"
+                items_any_of = items.get('anyOf')
+                if items_any_of is not None:
+                    return f"array of anyOf: {', '.join(self._anyof_type_names(items_any_of))}"
+                if 'type' in items:
+                    return f"array of {items['type']}"
+            return "array"
+        return prop_type
+
+    def _link_anyof(self, any_of, source, label_head, label_tail, name_prefix, id_prefix, edges, work):
+        """Link the members of an anyOf list from `source` in a single pass.
+
+        Referenced members get an edge to their schema node and inline objects are
+        queued as nodes of their own; edge labels are `label_head` + index + `label_tail`.
+        Returns the type name of each member, as `_anyof_type_names` would.
+        """
+        types = []
+        for i, item in enumerate(any_of):
+            item_ref = item.get('$ref')
+            if item_ref is not None:
+                types.append(self._ref_name(item_ref))
+                edges.append((source, self._ref_id(item_ref), f"{label_head}{i}{label_tail}"))
+                continue
+
+            item_type = item.get('type', "unknown")
+            types.append(item_type)
+            if item_type == 'object' and 'properties' in item:
+                # If it's an object with properties, process it
+                nested_id = self._queue_inline(f"{name_prefix} {i}",
+                                               {'type': 'object', 'properties': item['properties']},
+                                               f"{id_prefix}_{i}", work)
+                edges.append((source, nested_id, f"{label_head}{i}{label_tail}"))
+        return types
+
+    def _anyof_type_names(self, any_of):
+        """List the type or referenced component name of each anyOf member."""
+        types = []
+        for item in any_of:
+            ref = item.get('$ref')
+            if ref is not None:
+                types.append(self._ref_name(ref))
+            else:
+                types.append(item.get('type', "unknown"))
+        return types
 
     def _process_type(self, schema_name, schema, schema_id, graph):
-        """Process a schema type and create the appropriate node and edges."""
-        # Skip if we've already processed this schema
-        if schema_id in self.processed_refs:
-            return
+        """Process a schema type and create the appropriate nodes and edges.
 
-        # Mark as processed
-        self.processed_refs.add(schema_id)
+        Nested inline schemas are handled iteratively through a worklist rather
+        than by recursion, so deeply nested specs don't exhaust the call stack.
+        """
+        work = deque([(schema_name, schema, schema_id)])
+        edges = []
+        popleft = work.popleft
+        processed = self.processed_refs
+        emit = self._emit_type
+        while work:
+            name, sch, sid = popleft()
+
+            # Skip if we've already processed this schema
+            if sid in processed:
+                continue
+
+            # Mark as processed
+            processed.add(sid)
+            emit(name, sch, sid, graph, edges, work)
+
+        # Emit the collected edges once all nodes are in place, dropping exact duplicates
+        emitted = set()
+        for edge in edges:
+            if edge not in emitted:
+                emitted.add(edge)
+                graph.edge(edge[0], edge[1], label=edge[2])
+
+    def _emit_type(self, schema_name, schema, schema_id, graph, edges, work):
+        """Create the node for a single schema.
+
+        Its links are appended to `edges` and nested inline schemas are queued on `work`.
+        """
+        add_edge = edges.append
+        name = _html_escape(schema_name)
+        ref = schema.get('$ref')
+        any_of = schema.get('anyOf')
 
         # Handle reference type
-        if '$ref' in schema:
-            ref_type = schema['$ref'].split('/')[-1]
-            ref_id = f"schema_{ref_type}"
-            label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: reference</FONT>>"
+        if ref is not None:
+            label = _type_label(name, "reference")
             graph.node(schema_id, label=label)
-            graph.edge(schema_id, ref_id, label="references")
+            add_edge((schema_id, self._ref_id(ref), "references"))
             return
 
         # Handle anyOf type
-        if 'anyOf' in schema:
-            types = []
-            for i, item in enumerate(schema['anyOf']):
-                if '$ref' in item:
-                    ref_type = item['$ref'].split('/')[-1]
-                    types.append(ref_type)
-                    ref_id = f"schema_{ref_type}"
-                    graph.edge(schema_id, ref_id, label=f"anyOf[{i}]")
-                elif 'type' in item:
-                    types.append(item['type'])
-                    # If it's an object with properties, process it
-                    if item['type'] == 'object' and 'properties' in item:
-                        anyof_id = f"{schema_id}_anyOf_{i}"
-                        self._process_type(f"{schema_name} anyOf {i}", 
-                                          {'type': 'object', 'properties': item['properties']}, 
-                                          anyof_id, graph)
-                        graph.edge(schema_id, anyof_id, label=f"anyOf[{i}]")
-                else:
-                    types.append("unknown")
-
-            label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: anyOf: {', '.join(types)}</FONT>>"
+        if any_of is not None:
+            types = self._link_anyof(any_of, schema_id, "anyOf[", "]",
+                                     f"{schema_name} anyOf", f"{schema_id}_anyOf", edges, work)
+            label = _type_label(name, "anyOf: " + _html_escape(', '.join(types)))
             graph.node(schema_id, label=label)
             return
 
@@ -218,86 +518,67 @@ class OpenAPIGraphGenerator:
 
         if schema_type == 'object':
             properties = schema.get('properties', {})
-            prop_table = self._properties_as_html_table(schema_name, properties, schema_id, graph)
+            prop_table = self._properties_as_html_table(schema_name, properties, schema_id, edges, work)
             label = f"<{prop_table}>"
             graph.node(schema_id, label=label)
 
             # Process additional properties if they are objects or references
-            if 'additionalProperties' in schema and isinstance(schema['additionalProperties'], dict):
-                add_props = schema['additionalProperties']
-                if '$ref' in add_props:
-                    ref_type = add_props['$ref'].split('/')[-1]
-                    ref_id = f"schema_{ref_type}"
-                    graph.edge(schema_id, ref_id, label="additionalProperties")
+            add_props = schema.get('additionalProperties')
+            if isinstance(add_props, dict):
+                add_props_ref = add_props.get('$ref')
+                if add_props_ref is not None:
+                    add_edge((schema_id, self._ref_id(add_props_ref), "additionalProperties"))
                 elif add_props.get('type') == 'object' and 'properties' in add_props:
-                    add_props_id = f"{schema_id}_additionalProps"
-                    self._process_type("additionalProperties", add_props, add_props_id, graph)
-                    graph.edge(schema_id, add_props_id, label="additionalProperties")
+                    add_props_id = self._queue_inline("additionalProperties", add_props,
+                                                      f"{schema_id}_additionalProps", work)
+                    add_edge((schema_id, add_props_id, "additionalProperties"))
 
         elif schema_type == 'array':
-            if 'items' in schema:
-                items = schema['items']
-                if '$ref' in items:
-                    ref_type = items['$ref'].split('/')[-1]
-                    ref_id = f"schema_{ref_type}"
-                    label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: array of {ref_type}</FONT>>"
-                    graph.node(schema_id, label=label)
-                    graph.edge(schema_id, ref_id, label="items")
-                elif 'anyOf' in items:
-                    # Handle anyOf in array items
-                    types = []
-                    for i, item in enumerate(items['anyOf']):
-                        if '$ref' in item:
-                            ref_type = item['$ref'].split('/')[-1]
-                            types.append(ref_type)
-                            ref_id = f"schema_{ref_type}"
-                            graph.edge(schema_id, ref_id, label=f"items anyOf[{i}]")
-                        elif 'type' in item:
-                            types.append(item['type'])
-                            # If it's an object with properties, process it
-                            if item['type'] == 'object' and 'properties' in item:
-                                anyof_id = f"{schema_id}_items_anyOf_{i}"
-                                self._process_type(f"{schema_name} items anyOf {i}", 
-                                                  {'type': 'object', 'properties': item['properties']}, 
-                                                  anyof_id, graph)
-                                graph.edge(schema_id, anyof_id, label=f"items anyOf[{i}]")
-                        else:
-                            types.append("unknown")
-
-                    label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: array of anyOf: {', '.join(types)}</FONT>>"
-                    graph.node(schema_id, label=label)
-                elif 'type' in items:
-                    item_type = items['type']
-                    label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: array of {item_type}</FONT>>"
-                    graph.node(schema_id, label=label)
-
-                    # If array items are objects with properties, process them
-                    if item_type == 'object' and 'properties' in items:
-                        items_id = f"{schema_id}_items"
-                        self._process_type(f"{schema_name} items", 
-                                          {'type': 'object', 'properties': items['properties']}, 
-                                          items_id, graph)
-                        graph.edge(schema_id, items_id, label="items")
-                else:
-                    label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: array</FONT>>"
-                    graph.node(schema_id, label=label)
+            items = schema.get('items')
+            if items is None:
+                label = _type_label(name, "array")
+                graph.node(schema_id, label=label)
+                return
+
+            items_ref = items.get('$ref')
+            items_any_of = items.get('anyOf')
+            item_type = items.get('type')
+            if items_ref is not None:
+                ref_type = self._ref_name(items_ref)
+                label = _type_label(name, "array of " + _html_escape(ref_type))
+                graph.node(schema_id, label=label)
+                add_edge((schema_id, self._ref_id(items_ref), "items"))
+            elif items_any_of is not None:
+                # Handle anyOf in array items
+                types = self._link_anyof(items_any_of, schema_id, "items anyOf[", "]",
+                                         f"{schema_name} items anyOf", f"{schema_id}_items_anyOf", edges, work)
+                label = _type_label(name, "array of anyOf: " + _html_escape(', '.join(types)))
+                graph.node(schema_id, label=label)
+            elif item_type is not None:
+                label = _type_label(name, "array of " + _html_escape(item_type))
+                graph.node(schema_id, label=label)
+
+                # If array items are objects with properties, process them
+                if item_type == 'object' and 'properties' in items:
+                    items_id = self._queue_inline(f"{schema_name} items",
+                                                  {'type': 'object', 'properties': items['properties']},
+                                                  f"{schema_id}_items", work)
+                    add_edge((schema_id, items_id, "items"))
             else:
-                label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: array</FONT>>"
+                label = _type_label(name, "array")
                 graph.node(schema_id, label=label)
         else:
             # Simple type
-            label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: {schema_type}</FONT>>"
-            graph.node(schema_id, label=label)
+            type_text = _html_escape(schema_type)
 
             # Handle enum values for simple types
-            if 'enum' in schema:
-                enum_values = schema['enum']
-                if len(enum_values) <= 5:  # Only show if not too many values
-                    enum_str = ", ".join(str(v) for v in enum_values[:5])
-                    if len(enum_values) > 5:
-                        enum_str += "..."
-                    label = f"<{schema_name}<BR/><FONT POINT-SIZE='10'>type: {schema_type}<BR/>enum: {enum_str}</FONT>>"
-                    graph.node(schema_id, label=label, _attributes={'tooltip': str(enum_values)})
+            enum_values = schema.get('enum')
+            if enum_values is not None and len(enum_values) <= 5:  # Only show if not too many values
+                enum_str = ", ".join(str(v) for v in enum_values)
+                label = _type_label(name, type_text + "<BR/>enum: " + _html_escape(enum_str))
+                graph.node(schema_id, label=label, _attributes={'tooltip': str(enum_values)})
+            else:
+                graph.node(schema_id, label=_type_label(name, type_text))
 
     def _add_relationships(self):
         pass
@@ -315,19 +596,20 @@ class OpenAPIGraphGenerator:
             self.graph.save(dot_path)
             return dot_path
 
-        self.graph.render(output_path, format="svg", cleanup=True)
+        # Pipe the DOT source straight to Graphviz rather than rendering via a temporary DOT file
+        svg_content = self.graph.pipe(format="svg", encoding="utf-8")
+        svg_path = f"{output_path}.svg"
+        # Digraph.render() used to create missing output directories
+        os.makedirs(os.path.dirname(svg_path) or '.', exist_ok=True)
+        with open(svg_path, 'w', encoding='utf-8') as f:
+            f.write(svg_content)
 
         if use_viewer:
-            # Read the generated SVG file
-            svg_path = f"{output_path}.svg"
-            with open(svg_path, 'r') as f:
-                svg_content = f.read()
-
             # Add id to the SVG element for the viewer's JavaScript
             svg_content = svg_content.replace('<svg ', '<svg id="main-svg" ', 1)
 
             # Read the HTML template
-            with open('viewer_template.html', 'r') as f:
+            with open('viewer_template.html', 'r', encoding='utf-8') as f:
                 html_template = f.read()
 
             # Insert the SVG content into the template
@@ -335,25 +617,28 @@ class OpenAPIGraphGenerator:
 
             # Save the HTML file
             html_path = f"{output_path}.html"
-            with open(html_path, 'w') as f:
+            with open(html_path, 'w', encoding='utf-8') as f:
                 f.write(html_content)
 
             return html_path
 
-        return f"{output_path}.svg"
+        return svg_path
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Run the command line interface; ``argv`` defaults to ``sys.argv[1:]``."""
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Generate a graph visualization of an OpenAPI schema.')
     parser.add_argument('input_file', help='Path to the OpenAPI schema file (YAML or JSON)')
     parser.add_argument('-o', '--output', default='api_graph', help='Output file name (without extension, default: api_graph)')
     parser.add_argument('-v', '--viewer', action='store_true', help='Embed the SVG in an HTML viewer')
     parser.add_argument('--dot', action='store_true', help='Export the graph in DOT format')
-    args = parser.parse_args()
+    parser.add_argument('--all-schemas', action='store_true', help='Include schemas that are not referenced from any path')
+    parser.add_argument('--cache', action='store_true', help='Cache the parsed YAML spec next to the input file')
+    args = parser.parse_args(argv)
 
     # Generate the graph
-    generator = OpenAPIGraphGenerator(args.input_file)
+    generator = OpenAPIGraphGenerator(args.input_file, emit_all=args.all_schemas, cache=args.cache)
     graph = generator.generate_graph()
     output_file = generator.save(args.output, use_viewer=args.viewer, as_dot=args.dot)
 
@@ -363,3 +648,7 @@ if __name__ == "__main__":
         print(f"Graph saved to {output_file} (HTML viewer)")
     else:
         print(f"Graph saved to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,215 +1,422 @@
 import unittest
+import copy
+import datetime
 import json
 import os
 import tempfile
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, call
 import sys
 import yaml
 
+try:
+    # libyaml-backed dumper, much faster than the pure-Python one
+    from yaml import CSafeDumper as _YAMLDumper
+except ImportError:
+    from yaml import SafeDumper as _YAMLDumper
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+_SCRIPT = os.path.join(_ROOT, "openapi-viz.py")
+
 # Add the parent directory to the path so we can import the module
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(_ROOT)
 # Import the module directly since it's a script, not a package
 import importlib.util
-spec = importlib.util.spec_from_file_location("openapi_viz", 
-                                             os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                                         "openapi-viz.py"))
-openapi_viz = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(openapi_viz)
+# Load it only once per interpreter and register it so other test modules share the instance
+if "openapi_viz" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("openapi_viz", _SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["openapi_viz"] = module
+    spec.loader.exec_module(module)
+openapi_viz = sys.modules["openapi_viz"]
 OpenAPIGraphGenerator = openapi_viz.OpenAPIGraphGenerator
 
-class TestOpenAPIGraphGenerator(unittest.TestCase):
-    def setUp(self):
-        # Create a temporary file with a simple OpenAPI spec
-        self.temp_dir = tempfile.TemporaryDirectory()
-        self.spec_path = os.path.join(self.temp_dir.name, "test_spec.yaml")
-
-        # Simple OpenAPI spec with different types including anyOf
-        self.test_spec = {
-            "openapi": "3.0.0",
-            "info": {
-                "title": "Test API",
-                "version": "1.0.0"
+# Simple OpenAPI spec with different types including anyOf
+_TEST_SPEC = {
+    "openapi": "3.0.0",
+    "info": {
+        "title": "Test API",
+        "version": "1.0.0"
+    },
+    "components": {
+        "schemas": {
+            "SimpleType": {
+                "type": "string"
             },
-            "components": {
-                "schemas": {
-                    "SimpleType": {
-                        "type": "string"
-                    },
-                    "ArrayType": {
-                        "type": "array",
-                        "items": {
-                            "type": "string"
-                        }
-                    },
-                    "ObjectType": {
-                        "type": "object",
-                        "properties": {
-                            "prop1": {"type": "string"},
-                            "prop2": {"type": "integer"}
-                        }
-                    },
-                    "ReferenceType": {
-                        "$ref": "#/components/schemas/SimpleType"
-                    },
-                    "AnyOfType": {
+            "ArrayType": {
+                "type": "array",
+                "items": {
+                    "type": "string"
+                }
+            },
+            "ObjectType": {
+                "type": "object",
+                "properties": {
+                    "prop1": {"type": "string"},
+                    "prop2": {"type": "integer"}
+                }
+            },
+            "ReferenceType": {
+                "$ref": "#/components/schemas/SimpleType"
+            },
+            "AnyOfType": {
+                "anyOf": [
+                    {"type": "string"},
+                    {"$ref": "#/components/schemas/SimpleType"}
+                ]
+            },
+            "ArrayWithAnyOf": {
+                "type": "array",
+                "items": {
+                    "anyOf": [
+                        {"type": "string"},
+                        {"$ref": "#/components/schemas/SimpleType"}
+                    ]
+                }
+            },
+            "ObjectWithAnyOfProperty": {
+                "type": "object",
+                "properties": {
+                    "anyOfProp": {
                         "anyOf": [
                             {"type": "string"},
                             {"$ref": "#/components/schemas/SimpleType"}
                         ]
-                    },
-                    "ArrayWithAnyOf": {
-                        "type": "array",
-                        "items": {
-                            "anyOf": [
-                                {"type": "string"},
-                                {"$ref": "#/components/schemas/SimpleType"}
-                            ]
-                        }
-                    },
-                    "ObjectWithAnyOfProperty": {
-                        "type": "object",
-                        "properties": {
-                            "anyOfProp": {
-                                "anyOf": [
-                                    {"type": "string"},
-                                    {"$ref": "#/components/schemas/SimpleType"}
-                                ]
-                            }
-                        }
                     }
                 }
             }
         }
+    }
+}
+
+
+class _RecordingGraph:
+    """Minimal stand-in for graphviz.Digraph that records node and edge calls."""
+    __slots__ = ('calls', 'node_calls', 'edge_calls')
+
+    def __init__(self):
+        self.calls = []  # Method names, in call order
+        self.node_calls = []
+        self.edge_calls = []
+
+    def node(self, *args, **kwargs):
+        self.calls.append("node")
+        self.node_calls.append((args, kwargs))
+
+    def edge(self, *args, **kwargs):
+        self.calls.append("edge")
+        self.edge_calls.append((args, kwargs))
+
+
+# (property, expected label) pairs for test_get_property_type_label
+_LABEL_CASES = [
+    ({"type": "string"}, "string"),
+    ({"type": "array", "items": {"type": "string"}}, "array of string"),
+    ({"$ref": "#/components/schemas/SimpleType"}, "reference to SimpleType"),
+    (
+        {"anyOf": [{"type": "string"}, {"$ref": "#/components/schemas/SimpleType"}]},
+        "anyOf: string, SimpleType",
+    ),
+    (
+        {
+            "type": "array",
+            "items": {"anyOf": [{"type": "string"}, {"$ref": "#/components/schemas/SimpleType"}]},
+        },
+        "array of anyOf: string, SimpleType",
+    ),
+]
+
+# Viewer fixtures for test_save_with_viewer
+_SVG_FIXTURE = '<svg width="100" height="100"><circle cx="50" cy="50" r="40" /></svg>'
+_HTML_TEMPLATE_FIXTURE = '<!DOCTYPE html><html><body><div id="svg-container"><!-- Insert SVG content --></div></body></html>'
+_EXPECTED_HTML = '<!DOCTYPE html><html><body><div id="svg-container"><svg id="main-svg" width="100" height="100"><circle cx="50" cy="50" r="40" /></svg></div></body></html>'
+
+
+def _make_file_mock(contents):
+    """Return a mock file whose successive read() calls yield ``contents``."""
+    file_mock = MagicMock()
+    file_mock.__enter__.return_value.read.side_effect = list(contents)
+    return file_mock
 
-        # Write the spec to the temporary file
-        with open(self.spec_path, 'w') as f:
-            yaml.dump(self.test_spec, f)
 
-        # Initialize the generator with the test spec
-        self.generator = OpenAPIGraphGenerator(self.spec_path)
+# Temporary directory shared by every test in this module
+_TEMP_DIR = None
 
-    def tearDown(self):
-        # Clean up the temporary directory
-        self.temp_dir.cleanup()
+
+def setUpModule():
+    global _TEMP_DIR
+    _TEMP_DIR = tempfile.TemporaryDirectory()
+
+
+def tearDownModule():
+    _TEMP_DIR.cleanup()
+
+
+class TestOpenAPIGraphGenerator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Create a temporary file with a simple OpenAPI spec, shared by all tests
+        cls.temp_dir = _TEMP_DIR
+        cls.spec_path = os.path.join(cls.temp_dir.name, "test_spec.json")
+
+        # Shared, read-only fixture; tests that need a variant deep-copy it
+        cls.test_spec = _TEST_SPEC
+
+        # Write the spec to the temporary file, for the tests that load it from disk
+        with open(cls.spec_path, 'w') as f:
+            json.dump(cls.test_spec, f)
+
+    def setUp(self):
+        # Initialize the generator directly from the spec dict, skipping the YAML round-trip
+        self.generator = OpenAPIGraphGenerator(spec=self.test_spec)
+
+    def _write_spec(self, filename, test_spec):
+        """Write a variant of the test spec as YAML next to the shared one and return its path."""
+        spec_path = os.path.join(self.temp_dir.name, filename)
+        with open(spec_path, 'w') as f:
+            yaml.dump(test_spec, f, Dumper=_YAMLDumper)
+        return spec_path
 
     def test_load_spec(self):
         """Test that the spec is loaded correctly."""
-        self.assertEqual(self.generator.spec["openapi"], "3.0.0")
-        self.assertEqual(self.generator.spec["info"]["title"], "Test API")
-        self.assertIn("schemas", self.generator.spec["components"])
-
-    def test_get_property_type_label_simple(self):
-        """Test getting the type label for a simple type."""
-        prop_details = {"type": "string"}
-        label = self.generator._get_property_type_label(prop_details)
-        self.assertEqual(label, "string")
-
-    def test_get_property_type_label_array(self):
-        """Test getting the type label for an array type."""
-        prop_details = {"type": "array", "items": {"type": "string"}}
-        label = self.generator._get_property_type_label(prop_details)
-        self.assertEqual(label, "array of string")
-
-    def test_get_property_type_label_reference(self):
-        """Test getting the type label for a reference type."""
-        prop_details = {"$ref": "#/components/schemas/SimpleType"}
-        label = self.generator._get_property_type_label(prop_details)
-        self.assertEqual(label, "reference to SimpleType")
-
-    def test_get_property_type_label_anyof(self):
-        """Test getting the type label for an anyOf type."""
-        prop_details = {
-            "anyOf": [
-                {"type": "string"},
-                {"$ref": "#/components/schemas/SimpleType"}
-            ]
+        generator = OpenAPIGraphGenerator(self.spec_path)
+        self.assertEqual(generator.spec["openapi"], "3.0.0")
+        self.assertEqual(generator.spec["info"]["title"], "Test API")
+        self.assertIn("schemas", generator.spec["components"])
+        self.assertEqual(generator.spec, self.test_spec)
+
+    def test_load_spec_yaml(self):
+        """Test that a YAML spec is loaded correctly."""
+        spec_path = self._write_spec("test_spec.yaml", self.test_spec)
+        generator = OpenAPIGraphGenerator(spec_path)
+        self.assertEqual(generator.spec, self.test_spec)
+
+    def test_init_requires_spec(self):
+        """Test that a spec path or a spec dict is required."""
+        with self.assertRaises(ValueError):
+            OpenAPIGraphGenerator()
+
+    def test_ref_name(self):
+        """Test extracting the component name from a $ref."""
+        ref = "#/components/schemas/SimpleType"
+        self.assertEqual(self.generator._ref_name(ref), "SimpleType")
+        # Repeated lookups are served from the cache
+        self.assertIn(ref, self.generator._ref_name_cache)
+        self.assertEqual(self.generator._ref_name(ref), "SimpleType")
+
+    def test_yaml_loader(self):
+        """Test that YAML specs are parsed with the libyaml loader when it's available."""
+        expected = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        self.assertIs(openapi_viz._YAMLLoader, expected)
+
+    def test_load_spec_cache(self):
+        """Test that the parsed spec is cached and reused while the spec file is unchanged."""
+        test_spec = copy.deepcopy(self.test_spec)
+        spec_path = self._write_spec("cached_spec.yaml", test_spec)
+        cache_path = f"{spec_path}.cache.json"
+
+        generator = OpenAPIGraphGenerator(spec_path, cache=True)
+        self.assertTrue(os.path.exists(cache_path))
+        self.assertEqual(generator.spec, test_spec)
+
+        # A fresh cache is used instead of parsing the YAML again
+        with patch.object(openapi_viz.yaml, 'load') as mock_load:
+            generator = OpenAPIGraphGenerator(spec_path, cache=True)
+            mock_load.assert_not_called()
+        self.assertEqual(generator.spec, test_spec)
+
+        # Changing the spec invalidates the cache
+        test_spec["info"]["title"] = "Changed API"
+        self._write_spec("cached_spec.yaml", test_spec)
+        generator = OpenAPIGraphGenerator(spec_path, cache=True)
+        self.assertEqual(generator.spec["info"]["title"], "Changed API")
+
+    def test_load_spec_cache_dates(self):
+        """Test that specs with dates are loaded with --cache and never leave a broken cache."""
+        spec_path = os.path.join(self.temp_dir.name, "dated_spec.yaml")
+        cache_path = f"{spec_path}.cache.json"
+
+        # A date key cannot be stored as JSON, so the spec is returned uncached
+        with open(spec_path, 'w') as f:
+            f.write("openapi: 3.0.0\nx-changes:\n  2024-01-01: added\n")
+        generator = OpenAPIGraphGenerator(spec_path, cache=True)
+        self.assertEqual(generator.spec["x-changes"], {datetime.date(2024, 1, 1): "added"})
+        self.assertFalse(os.path.exists(cache_path))
+
+        # Date values are cached as ISO strings
+        with open(spec_path, 'w') as f:
+            f.write("openapi: 3.0.0\nx-released: 2024-01-01\n")
+        generator = OpenAPIGraphGenerator(spec_path, cache=True)
+        self.assertEqual(generator.spec["x-released"], datetime.date(2024, 1, 1))
+        with open(cache_path) as f:
+            self.assertEqual(json.load(f)["spec"]["x-released"], "2024-01-01")
+        generator = OpenAPIGraphGenerator(spec_path, cache=True)
+        self.assertEqual(generator.spec["x-released"], "2024-01-01")
+        self.assertFalse([name for name in os.listdir(self.temp_dir.name) if name.endswith(".tmp")])
+
+    def test_index_refs(self):
+        """Test that every $ref in the spec is resolved when the generator is created."""
+        ref = "#/components/schemas/SimpleType"
+        self.assertEqual(self.generator._ref_to_id, {ref: "schema_SimpleType"})
+        self.assertEqual(self.generator._ref_id(ref), "schema_SimpleType")
+
+        # Refs are attributed to the component that uses them
+        refs_by_owner = self.generator._refs_by_owner
+        self.assertEqual(refs_by_owner["#/components/schemas/ReferenceType"], {ref})
+        self.assertEqual(refs_by_owner["#/components/schemas/ObjectWithAnyOfProperty"], {ref})
+        self.assertEqual(refs_by_owner["#/components/schemas/ObjectType"], set())
+
+    def test_reachable_schemas_without_paths(self):
+        """Test that every schema is kept when the spec has no paths."""
+        self.assertIsNone(self.generator._reachable_schemas())
+
+    def test_reachable_schemas(self):
+        """Test that only schemas referenced from paths, directly or transitively, are reachable."""
+        test_spec = copy.deepcopy(self.test_spec)
+        test_spec["paths"] = {
+            "/items": {
+                "get": {
+                    "responses": {
+                        "200": {"$ref": "#/components/responses/ItemResponse"}
+                    }
+                }
+            }
+        }
+        test_spec["components"]["responses"] = {
+            "ItemResponse": {
+                "content": {
+                    "application/json": {
+                        "schema": {"$ref": "#/components/schemas/ReferenceType"}
+                    }
+                }
+            }
         }
-        label = self.generator._get_property_type_label(prop_details)
-        self.assertEqual(label, "anyOf: string, SimpleType")
+        generator = OpenAPIGraphGenerator(spec=test_spec)
+        self.assertEqual(generator._reachable_schemas(), {"ReferenceType", "SimpleType"})
 
-    def test_get_property_type_label_array_with_anyof(self):
-        """Test getting the type label for an array with anyOf items."""
-        prop_details = {
-            "type": "array",
-            "items": {
-                "anyOf": [
-                    {"type": "string"},
-                    {"$ref": "#/components/schemas/SimpleType"}
-                ]
+        generator.generate_graph()
+        self.assertEqual(generator.processed_refs, {"schema_ReferenceType", "schema_SimpleType"})
+
+        # emit_all keeps the unreferenced schemas
+        generator = OpenAPIGraphGenerator(spec=test_spec, emit_all=True)
+        generator.generate_graph()
+        self.assertIn("schema_ObjectType", generator.processed_refs)
+
+    def test_reachable_schemas_nested_and_escaped_refs(self):
+        """Test that refs into a schema and escaped schema names keep their schemas reachable."""
+        test_spec = {
+            "openapi": "3.0.0",
+            "paths": {
+                "/pets": {
+                    "get": {
+                        "responses": {
+                            "200": {"content": {"application/json": {"schema": {
+                                "$ref": "#/components/schemas/Pet/properties/owner"
+                            }}}},
+                            "404": {"content": {"application/json": {"schema": {
+                                "$ref": "#/components/schemas/errors~1NotFound%20Error"
+                            }}}}
+                        }
+                    }
+                }
+            },
+            "components": {
+                "schemas": {
+                    "Pet": {"type": "object", "properties": {"owner": {"$ref": "#/components/schemas/Owner"}}},
+                    "Owner": {"type": "object", "properties": {"name": {"type": "string"}}},
+                    "errors/NotFound Error": {"type": "object", "properties": {"message": {"type": "string"}}},
+                    "Unused": {"type": "string"}
+                }
             }
         }
-        label = self.generator._get_property_type_label(prop_details)
-        self.assertEqual(label, "array of anyOf: string, SimpleType")
 
-    @patch('graphviz.Digraph')
-    def test_process_type_simple(self, mock_digraph):
+        generator = OpenAPIGraphGenerator(spec=test_spec)
+        self.assertEqual(generator._reachable_schemas(), {"Pet", "Owner", "errors/NotFound Error"})
+
+    def test_get_property_type_label(self):
+        """Test the type label for each kind of property."""
+        for prop_details, expected in _LABEL_CASES:
+            with self.subTest(prop=prop_details):
+                self.assertEqual(self.generator._get_property_type_label(prop_details), expected)
+
+    def test_process_type_simple(self):
         """Test processing a simple type."""
-        # Create a mock graph
-        mock_graph = MagicMock()
+        # Create a recording graph
+        graph = _RecordingGraph()
 
         # Process a simple type
         schema_name = "TestSimple"
         schema = {"type": "string"}
         schema_id = "schema_TestSimple"
 
-        self.generator._process_type(schema_name, schema, schema_id, mock_graph)
+        self.generator._process_type(schema_name, schema, schema_id, graph)
 
         # Check that the node was created with the correct label
-        mock_graph.node.assert_called_once()
-        args, kwargs = mock_graph.node.call_args
+        self.assertEqual(len(graph.node_calls), 1)
+        args, kwargs = graph.node_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertIn("type: string", kwargs["label"])
 
-    @patch('graphviz.Digraph')
-    def test_process_type_array(self, mock_digraph):
+    def test_process_type_enum(self):
+        """Test processing a simple type with enum values."""
+        graph = _RecordingGraph()
+
+        schema = {"type": "string", "enum": ["a", "b"]}
+        self.generator._process_type("TestEnum", schema, "schema_TestEnum", graph)
+
+        # The enum values are part of the one node emitted for the schema
+        self.assertEqual(len(graph.node_calls), 1)
+        args, kwargs = graph.node_calls[-1]
+        self.assertIn("type: string<BR/>enum: a, b", kwargs["label"])
+        self.assertEqual(kwargs["_attributes"], {'tooltip': "['a', 'b']"})
+
+    def test_process_type_array(self):
         """Test processing an array type."""
-        # Create a mock graph
-        mock_graph = MagicMock()
+        # Create a recording graph
+        graph = _RecordingGraph()
 
         # Process an array type
         schema_name = "TestArray"
         schema = {"type": "array", "items": {"type": "string"}}
         schema_id = "schema_TestArray"
 
-        self.generator._process_type(schema_name, schema, schema_id, mock_graph)
+        self.generator._process_type(schema_name, schema, schema_id, graph)
 
         # Check that the node was created with the correct label
-        mock_graph.node.assert_called_once()
-        args, kwargs = mock_graph.node.call_args
+        self.assertEqual(len(graph.node_calls), 1)
+        args, kwargs = graph.node_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertIn("type: array of string", kwargs["label"])
 
-    @patch('graphviz.Digraph')
-    def test_process_type_reference(self, mock_digraph):
+    def test_process_type_reference(self):
         """Test processing a reference type."""
-        # Create a mock graph
-        mock_graph = MagicMock()
+        # Create a recording graph
+        graph = _RecordingGraph()
 
         # Process a reference type
         schema_name = "TestReference"
         schema = {"$ref": "#/components/schemas/SimpleType"}
         schema_id = "schema_TestReference"
 
-        self.generator._process_type(schema_name, schema, schema_id, mock_graph)
+        self.generator._process_type(schema_name, schema, schema_id, graph)
 
         # Check that the node was created with the correct label
-        mock_graph.node.assert_called_once()
-        args, kwargs = mock_graph.node.call_args
+        self.assertEqual(len(graph.node_calls), 1)
+        args, kwargs = graph.node_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertIn("type: reference", kwargs["label"])
 
         # Check that an edge was created to the referenced type
-        mock_graph.edge.assert_called_once()
-        args, kwargs = mock_graph.edge.call_args
+        self.assertEqual(len(graph.edge_calls), 1)
+        args, kwargs = graph.edge_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertEqual(args[1], "schema_SimpleType")
         self.assertEqual(kwargs["label"], "references")
 
-    @patch('graphviz.Digraph')
-    def test_process_type_anyof(self, mock_digraph):
+    def test_process_type_anyof(self):
         """Test processing an anyOf type."""
-        # Create a mock graph
-        mock_graph = MagicMock()
+        # Create a recording graph
+        graph = _RecordingGraph()
 
         # Process an anyOf type
         schema_name = "TestAnyOf"
@@ -221,26 +428,25 @@ class TestOpenAPIGraphGenerator(unittest.TestCase):
         }
         schema_id = "schema_TestAnyOf"
 
-        self.generator._process_type(schema_name, schema, schema_id, mock_graph)
+        self.generator._process_type(schema_name, schema, schema_id, graph)
 
         # Check that the node was created with the correct label
-        mock_graph.node.assert_called_once()
-        args, kwargs = mock_graph.node.call_args
+        self.assertEqual(len(graph.node_calls), 1)
+        args, kwargs = graph.node_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertIn("type: anyOf: string, SimpleType", kwargs["label"])
 
         # Check that an edge was created to the referenced type
-        mock_graph.edge.assert_called_once()
-        args, kwargs = mock_graph.edge.call_args
+        self.assertEqual(len(graph.edge_calls), 1)
+        args, kwargs = graph.edge_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertEqual(args[1], "schema_SimpleType")
         self.assertEqual(kwargs["label"], "anyOf[1]")
 
-    @patch('graphviz.Digraph')
-    def test_process_type_array_with_anyof(self, mock_digraph):
+    def test_process_type_array_with_anyof(self):
         """Test processing an array type with anyOf items."""
-        # Create a mock graph
-        mock_graph = MagicMock()
+        # Create a recording graph
+        graph = _RecordingGraph()
 
         # Process an array with anyOf items
         schema_name = "TestArrayWithAnyOf"
@@ -255,21 +461,130 @@ class TestOpenAPIGraphGenerator(unittest.TestCase):
         }
         schema_id = "schema_TestArrayWithAnyOf"
 
-        self.generator._process_type(schema_name, schema, schema_id, mock_graph)
+        self.generator._process_type(schema_name, schema, schema_id, graph)
 
         # Check that the node was created with the correct label
-        mock_graph.node.assert_called_once()
-        args, kwargs = mock_graph.node.call_args
+        self.assertEqual(len(graph.node_calls), 1)
+        args, kwargs = graph.node_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertIn("type: array of anyOf: string, SimpleType", kwargs["label"])
 
         # Check that an edge was created to the referenced type
-        mock_graph.edge.assert_called_once()
-        args, kwargs = mock_graph.edge.call_args
+        self.assertEqual(len(graph.edge_calls), 1)
+        args, kwargs = graph.edge_calls[-1]
         self.assertEqual(args[0], schema_id)
         self.assertEqual(args[1], "schema_SimpleType")
         self.assertEqual(kwargs["label"], "items anyOf[1]")
 
+    def test_process_type_escapes_html(self):
+        """Test that names and values are escaped in HTML labels."""
+        graph = _RecordingGraph()
+
+        schema = {"type": "object", "properties": {"a<b>": {"type": "string", "enum": ["x&y"]}}}
+        self.generator._process_type("Map<K,V>", schema, "schema_Map", graph)
+
+        args, kwargs = graph.node_calls[-1]
+        self.assertIn("<B>Map&lt;K,V&gt;</B>", kwargs["label"])
+        self.assertIn("<TD>a&lt;b&gt;</TD>", kwargs["label"])
+
+        graph = _RecordingGraph()
+        self.generator._process_type("Amp&", {"type": "string", "enum": ["x&y"]}, "schema_Amp", graph)
+        args, kwargs = graph.node_calls[-1]
+        self.assertIn("Amp&amp;<BR/>", kwargs["label"])
+        self.assertIn("enum: x&amp;y", kwargs["label"])
+
+    def test_process_type_deeply_nested(self):
+        """Test processing inline objects nested deeper than the recursion limit."""
+        graph = _RecordingGraph()
+
+        depth = sys.getrecursionlimit() + 100
+        schema = {"type": "object", "properties": {"leaf": {"type": "string"}}}
+        for _ in range(depth):
+            schema = {"type": "object", "properties": {"child": schema}}
+
+        self.generator._process_type("TestNested", schema, "schema_TestNested", graph)
+
+        # One node per nesting level, each linked to its parent; the small
+        # innermost object is drawn inside the table of the deepest level
+        self.assertEqual(len(graph.node_calls), depth)
+        self.assertEqual(len(graph.edge_calls), depth - 1)
+
+    def test_process_type_small_inline_object(self):
+        """Test that small inline objects are drawn inside their parent's table."""
+        graph = _RecordingGraph()
+
+        schema = {
+            "type": "object",
+            "properties": {
+                "point": {
+                    "type": "object",
+                    "properties": {"x": {"type": "integer"}, "y": {"type": "integer"}}
+                },
+                "tags": {
+                    "type": "array",
+                    "items": {"type": "object", "properties": {"name": {"type": "string"}}}
+                }
+            }
+        }
+
+        self.generator._process_type("TestSmall", schema, "schema_TestSmall", graph)
+
+        self.assertEqual(len(graph.node_calls), 1)
+        self.assertEqual(graph.edge_calls, [])
+        args, kwargs = graph.node_calls[-1]
+        self.assertIn("<TD COLSPAN='2'>object</TD></TR><TR><TD>x</TD><TD>integer</TD></TR>", kwargs["label"])
+        self.assertIn("<TD COLSPAN='2'>array of object</TD></TR><TR><TD>name</TD><TD>string</TD></TR>", kwargs["label"])
+
+    def test_process_type_shared_inline_object(self):
+        """Test that identical inline objects are emitted as a single node."""
+        graph = _RecordingGraph()
+
+        address = {
+            "type": "object",
+            "properties": {
+                "street": {"type": "string"},
+                "country": {"$ref": "#/components/schemas/SimpleType"}
+            }
+        }
+        schema = {
+            "type": "object",
+            "properties": {
+                "home": address,
+                "work": dict(address)
+            }
+        }
+        schema_id = "schema_TestShared"
+
+        self.generator._process_type("TestShared", schema, schema_id, graph)
+
+        # The parent plus one shared node for both properties
+        self.assertEqual(len(graph.node_calls), 2)
+        targets = [args[1] for args, kwargs in graph.edge_calls]
+        self.assertEqual(targets[:2], ["schema_TestShared_home", "schema_TestShared_home"])
+
+        # Edges are emitted after all of the nodes
+        self.assertEqual(graph.calls, ["node", "node", "edge", "edge", "edge"])
+
+    def test_process_type_inline_object_mixed_keys(self):
+        """Test inline objects whose property names mix strings with YAML bools."""
+        graph = _RecordingGraph()
+
+        # PyYAML loads unquoted keys like `on` as True
+        settings = yaml.load("on: {type: boolean}\nlabel: {type: string}\ncolor: {type: string}\n"
+                             "size: {type: integer}\nmode: {type: string}\n", Loader=openapi_viz._YAMLLoader)
+        self.assertIn(True, settings)
+        schema = {
+            "type": "object",
+            "properties": {"settings": {"type": "object", "properties": settings}}
+        }
+
+        self.generator._process_type("TestMixed", schema, "schema_TestMixed", graph)
+
+        self.assertEqual(len(graph.node_calls), 2)
+        self.assertEqual([args[1] for args, kwargs in graph.edge_calls], ["schema_TestMixed_settings"])
+        args, kwargs = graph.node_calls[-1]
+        self.assertIn("<TD>True</TD><TD>boolean</TD>", kwargs["label"])
+
     def test_generate_graph(self):
         """Test generating the complete graph."""
         # Generate the graph
@@ -286,51 +601,60 @@ class TestOpenAPIGraphGenerator(unittest.TestCase):
         """Test saving the graph."""
         # Generate the graph
         self.generator.generate_graph()
+        output_base = os.path.join(self.temp_dir.name, "test_output")
 
-        # Patch the render method of the actual graph object
-        with patch.object(self.generator.graph, 'render') as mock_render:
+        # Patch the pipe method of the actual graph object
+        with patch.object(self.generator.graph, 'pipe', return_value='<svg></svg>') as mock_pipe:
             # Save the graph
-            output_path = self.generator.save("test_output")
+            output_path = self.generator.save(output_base)
 
-            # Check that the render method was called with the correct arguments
-            mock_render.assert_called_once_with("test_output", format="svg", cleanup=True)
+            # Check that the SVG was rendered in memory
+            mock_pipe.assert_called_once_with(format="svg", encoding="utf-8")
 
-            # Check that the correct output path is returned
-            self.assertEqual(output_path, "test_output.svg")
+            # Check that the correct output path is returned and the SVG written to it
+            self.assertEqual(output_path, f"{output_base}.svg")
+            with open(output_path) as f:
+                self.assertEqual(f.read(), '<svg></svg>')
+
+            # The SVG is written as UTF-8 whatever the locale encoding
+            mock_pipe.return_value = '<svg><text>Café ✓</text></svg>'
+            output_path = self.generator.save(output_base)
+            with open(output_path, 'rb') as f:
+                self.assertEqual(f.read().decode('utf-8'), '<svg><text>Café ✓</text></svg>')
+            mock_pipe.return_value = '<svg></svg>'
+
+            # Missing output directories are created
+            nested_base = os.path.join(self.temp_dir.name, "missing", "dir", "test_output")
+            output_path = self.generator.save(nested_base)
+            with open(output_path) as f:
+                self.assertEqual(f.read(), '<svg></svg>')
 
     def test_save_with_viewer(self):
         """Test saving the graph with HTML viewer."""
         # Generate the graph
         self.generator.generate_graph()
 
-        # Create a temporary SVG content for testing
-        svg_content = '<svg width="100" height="100"><circle cx="50" cy="50" r="40" /></svg>'
-        html_template = '<!DOCTYPE html><html><body><div id="svg-container"><!-- Insert SVG content --></div></body></html>'
-        expected_html = '<!DOCTYPE html><html><body><div id="svg-container"><svg id="main-svg" width="100" height="100"><circle cx="50" cy="50" r="40" /></svg></div></body></html>'
-
-        # Create a mock file handler that returns different content for different files
-        file_mock = MagicMock()
-        file_mock.__enter__.return_value.read.side_effect = [svg_content, html_template]
+        # Only the template is read back
+        file_mock = _make_file_mock([_HTML_TEMPLATE_FIXTURE])
 
-        # Patch the render method and open function
-        with patch.object(self.generator.graph, 'render') as mock_render, \
+        # Patch the pipe method and open function
+        with patch.object(self.generator.graph, 'pipe', return_value=_SVG_FIXTURE) as mock_pipe, \
              patch('builtins.open', return_value=file_mock):
 
             # Save the graph with viewer
             output_path = self.generator.save("test_output", use_viewer=True)
 
-            # Check that the render method was called with the correct arguments
-            mock_render.assert_called_once_with("test_output", format="svg", cleanup=True)
+            # Check that the SVG was rendered in memory
+            mock_pipe.assert_called_once_with(format="svg", encoding="utf-8")
 
             # Check that the correct output path is returned
             self.assertEqual(output_path, "test_output.html")
 
             # Verify that open was called for the SVG, template, and output HTML
-            from unittest.mock import call
             open_calls = [
-                call("test_output.svg", 'r'),
-                call('viewer_template.html', 'r'),
-                call("test_output.html", 'w')
+                call("test_output.svg", 'w', encoding='utf-8'),
+                call('viewer_template.html', 'r', encoding='utf-8'),
+                call("test_output.html", 'w', encoding='utf-8')
             ]
 
             # Check that open was called with the expected arguments
@@ -338,118 +662,40 @@ class TestOpenAPIGraphGenerator(unittest.TestCase):
             for expected_call in open_calls:
                 self.assertIn(expected_call, open.call_args_list)
 
+            # Check that the SVG and the viewer page were written
+            writes = file_mock.__enter__.return_value.write.call_args_list
+            self.assertIn(call(_SVG_FIXTURE), writes)
+            self.assertIn(call(_EXPECTED_HTML), writes)
+
     def test_command_line_args(self):
         """Test command line argument parsing."""
-        # Test with viewer option
-        test_args = ['openapi-viz.py', 'test_spec.yaml', '-v']
-
-        # Create a mock for the OpenAPIGraphGenerator class
         mock_generator_class = MagicMock()
         mock_generator = mock_generator_class.return_value
-        mock_generator.generate_graph.return_value = "mock_graph"
         mock_generator.save.return_value = "test_spec.html"
 
-        # Save the original class to restore it later
-        original_class = openapi_viz.OpenAPIGraphGenerator
-
-        try:
-            # Replace the class with our mock
-            openapi_viz.OpenAPIGraphGenerator = mock_generator_class
-
-            # Patch sys.argv and print
-            with patch('sys.argv', test_args), patch('builtins.print') as mock_print:
-                # Execute the main block directly from the module
-                # This is the code that would run if the script was executed directly
-                if hasattr(openapi_viz, 'main'):
-                    openapi_viz.main()
-                else:
-                    # Get the argparse module from the openapi_viz module
-                    argparse_module = openapi_viz.argparse
-
-                    # Create a parser and parse the arguments
-                    parser = argparse_module.ArgumentParser(description='Generate a graph visualization of an OpenAPI schema.')
-                    parser.add_argument('input_file', help='Path to the OpenAPI schema file (YAML or JSON)')
-                    parser.add_argument('-o', '--output', default='api_graph', help='Output file name (without extension, default: api_graph)')
-                    parser.add_argument('-v', '--viewer', action='store_true', help='Embed the SVG in an HTML viewer')
-                    args = parser.parse_args()
-
-                    # Generate the graph
-                    generator = openapi_viz.OpenAPIGraphGenerator(args.input_file)
-                    graph = generator.generate_graph()
-                    output_file = generator.save(args.output, use_viewer=args.viewer)
-
-                    # Print the output message
-                    if args.viewer:
-                        print(f"Graph saved to {output_file} (HTML viewer)")
-                    else:
-                        print(f"Graph saved to {output_file}")
-        finally:
-            # Restore the original class
-            openapi_viz.OpenAPIGraphGenerator = original_class
-
-            try:
-                # Check that the generator was initialized with the correct input file
-                mock_generator_class.assert_called_once_with('test_spec.yaml')
-
-                # Check that generate_graph was called
-                mock_generator.generate_graph.assert_called_once()
-
-                # Check that save was called with the correct arguments
-                mock_generator.save.assert_called_once_with('api_graph', use_viewer=True)
-
-                # Check that the correct output message was printed
-                mock_print.assert_called_once_with("Graph saved to test_spec.html (HTML viewer)")
-            except AssertionError as e:
-                # Re-raise the assertion error with more context
-                raise AssertionError(f"Test assertions failed: {e}\n"
-                                    f"mock_generator_class calls: {mock_generator_class.mock_calls}\n"
-                                    f"mock_generator.generate_graph calls: {mock_generator.generate_graph.mock_calls}\n"
-                                    f"mock_generator.save calls: {mock_generator.save.mock_calls}\n"
-                                    f"mock_print calls: {mock_print.mock_calls if 'mock_print' in locals() else 'Not available'}")
+        with patch.object(openapi_viz, 'OpenAPIGraphGenerator', mock_generator_class), \
+                patch('builtins.print') as mock_print:
+            openapi_viz.main(['test_spec.yaml', '-v'])
+
+        mock_generator_class.assert_called_once_with('test_spec.yaml', emit_all=False, cache=False)
+        mock_generator.generate_graph.assert_called_once()
+        mock_generator.save.assert_called_once_with('api_graph', use_viewer=True, as_dot=False)
+        mock_print.assert_called_once_with("Graph saved to test_spec.html (HTML viewer)")
 
     def test_dot_command_line_option(self):
         """Test command line --dot option for DOT export."""
-        test_args = ['openapi-viz.py', 'test_spec.yaml', '--dot']
         mock_generator_class = MagicMock()
         mock_generator = mock_generator_class.return_value
-        mock_generator.generate_graph.return_value = "mock_graph"
         mock_generator.save.return_value = "api_graph.dot"
-        original_class = openapi_viz.OpenAPIGraphGenerator
-        try:
-            openapi_viz.OpenAPIGraphGenerator = mock_generator_class
-            with patch('sys.argv', test_args), patch('builtins.print') as mock_print:
-                if hasattr(openapi_viz, 'main'):
-                    openapi_viz.main()
-                else:
-                    argparse_module = openapi_viz.argparse
-                    parser = argparse_module.ArgumentParser(description='Generate a graph visualization of an OpenAPI schema.')
-                    parser.add_argument('input_file', help='Path to the OpenAPI schema file (YAML or JSON)')
-                    parser.add_argument('-o', '--output', default='api_graph', help='Output file name (without extension, default: api_graph)')
-                    parser.add_argument('-v', '--viewer', action='store_true', help='Embed the SVG in an HTML viewer')
-                    parser.add_argument('--dot', action='store_true', help='Export the graph in DOT format')
-                    args = parser.parse_args()
-                    generator = openapi_viz.OpenAPIGraphGenerator(args.input_file)
-                    graph = generator.generate_graph()
-                    output_file = generator.save(args.output, use_viewer=args.viewer, as_dot=args.dot)
-                    if args.dot:
-                        print(f"Graph saved to {output_file} (DOT format)")
-                    elif args.viewer:
-                        print(f"Graph saved to {output_file} (HTML viewer)")
-                    else:
-                        print(f"Graph saved to {output_file}")
-        finally:
-            openapi_viz.OpenAPIGraphGenerator = original_class
-            try:
-                mock_generator_class.assert_called_once_with('test_spec.yaml')
-                mock_generator.generate_graph.assert_called_once()
-                mock_generator.save.assert_called_once_with('api_graph', use_viewer=False, as_dot=True)
-                mock_print.assert_called_once_with("Graph saved to api_graph.dot (DOT format)")
-            except AssertionError as e:
-                raise AssertionError(f"Test assertions failed: {e}\n"
-                                    f"mock_generator_class calls: {mock_generator_class.mock_calls}\n"
-                                    f"mock_generator.generate_graph calls: {mock_generator.generate_graph.mock_calls}\n"
-                                    f"mock_generator.save calls: {mock_generator.save.mock_calls}\n"
-                                    f"mock_print calls: {mock_print.mock_calls if 'mock_print' in locals() else 'Not available'}")
+
+        with patch.object(openapi_viz, 'OpenAPIGraphGenerator', mock_generator_class), \
+                patch('builtins.print') as mock_print:
+            openapi_viz.main(['test_spec.yaml', '--dot'])
+
+        mock_generator_class.assert_called_once_with('test_spec.yaml', emit_all=False, cache=False)
+        mock_generator.generate_graph.assert_called_once()
+        mock_generator.save.assert_called_once_with('api_graph', use_viewer=False, as_dot=True)
+        mock_print.assert_called_once_with("Graph saved to api_graph.dot (DOT format)")
 
 if __name__ == "__main__":
     unittest.main()